@@ -159,6 +159,9 @@ class CodeEditorBase(QtWidgets.QPlainTextEdit):
             element.key: element.defaultFormat
             for element in self.getStyleElementDescriptions()
         }
+        # Lookup of the names as given to getStyleElementFormat(). The formats
+        # are updated in place by setStyle(), so this never gets stale.
+        self.__styleByName = {}
 
         # Connext style update
         self.styleChanged.connect(self.__afterSetStyle)
@@ -492,11 +495,17 @@ class CodeEditorBase(QtWidgets.QPlainTextEdit):
         the given name. The name is case insensitive and invariant to
         the use of spaces.
         """
+        try:
+            return self.__styleByName[name]
+        except KeyError:
+            pass
         key = name.replace(" ", "").lower()
         try:
-            return self.__style[key]
+            format = self.__style[key]
         except KeyError:
             raise KeyError('Not a known style element name: "{}".'.format(name))
+        self.__styleByName[name] = format
+        return format
 
     def setStyle(self, style=None, **kwargs):
         """Updates the formatting per style element.
@@ -677,7 +686,9 @@ class CodeEditorBase(QtWidgets.QPlainTextEdit):
         the current selection
 
         The supplied cursor will be located at the beginning of each block. This
-        cursor may be modified by the function as required
+        cursor may be modified by the function as required. The function can
+        return False to stop the iteration, e.g. when it knows that the
+        remaining blocks are outside the area it paints.
         """
 
         # Note: a 'TextCursor' does not represent the actual on-screen cursor, so
@@ -731,7 +742,8 @@ class CodeEditorBase(QtWidgets.QPlainTextEdit):
 
         while True:
             # Call the function with a copy of the cursor
-            function(QtGui.QTextCursor(cursor))
+            if function(QtGui.QTextCursor(cursor)) is False:
+                break  # The function is done
 
             # Go to the next block (or not if we are done)
             y = self.cursorRect(cursor).bottom()
@@ -845,6 +857,8 @@ class CodeEditorBase(QtWidgets.QPlainTextEdit):
         if handle is None:
             handle = len(self._leftmargins)
             self._leftmargins.append(0)
+        elif self._leftmargins[handle] == width:
+            return handle  # nothing changed, avoid a relayout
         self._leftmargins[handle] = width
 
         leftmargin = sum(self._leftmargins)
@@ -14,6 +14,62 @@ from ..manager import Manager
 
 from ..parsers.tokens import ParenthesisToken
 import enum
+import re
+import math
+import bisect
+
+
+def _round(value):
+    """Round to the nearest integer, the same way as Qt does it for rectangles."""
+    return math.floor(value + 0.5)
+
+
+def _outlinedRegion(rects):
+    """Get the region covered by the given rectangles, when painted with a pen
+    (which adds one pixel at the right and bottom).
+    """
+    region = QtGui.QRegion()
+    for rect in rects:
+        region = region.united(rect.adjusted(0, 0, 1, 1))
+    return region
+
+
+def _updateSideBar(editor, area, width, event, lastScrollKey):
+    """Schedule a repaint of the given side bar (e.g. the line numbers) next to
+    the part of the viewport that is being repainted by the given event. The
+    whole side bar is repainted if the view was scrolled since the last call,
+    as indicated by the given scroll key. Returns the new scroll key.
+    """
+    offset = editor.contentOffset()
+    scrollKey = editor.firstVisibleBlock().blockNumber(), offset.y()
+    if scrollKey != lastScrollKey:
+        area.update(0, 0, int(width), editor.height())
+    else:
+        rect = event.rect()
+        viewport = editor.viewport()
+        y = area.mapFromGlobal(viewport.mapToGlobal(rect.topLeft())).y()
+        area.update(0, y, int(width), rect.height())
+    return scrollKey
+
+
+def _mergeRowRects(rects):
+    """Merge rectangles that are on the same row (same top and height) and
+    that touch or overlap, so that they can be painted in one go.
+    """
+    rects = sorted(rects, key=lambda r: (r.top(), r.height(), r.left()))
+    merged = [rects[0]]
+    for rect in rects[1:]:
+        last = merged[-1]
+        if (
+            rect.top() == last.top()
+            and rect.height() == last.height()
+            and rect.left() <= last.right() + 1
+        ):
+            if rect.right() > last.right():
+                last.setRight(rect.right())
+        else:
+            merged.append(rect)
+    return merged
 
 
 class HighlightMatchingOccurrences:
@@ -26,6 +82,17 @@ class HighlightMatchingOccurrences:
         )
     ]
 
+    _wordCharPattern = re.compile(r"\w")
+
+    def __init__(self, *args, **kwds):
+        self.__highlightCache = None
+        super().__init__(*args, **kwds)
+        # The cached highlight rectangles are invalid when the layout changes
+        self.document().documentLayout().update.connect(self.__clearHighlightCache)
+
+    def __clearHighlightCache(self, *args):
+        self.__highlightCache = None
+
     def highlightMatchingOccurrences(self):
         """highlightMatchingOccurrences()
 
@@ -40,82 +107,155 @@ class HighlightMatchingOccurrences:
         Set whether to highlight matching occurrences.
         """
         self.__highlightMatchingOccurrences = bool(value)
+        self.__highlightNeedleText = None
+        self.__highlightNeedle = None
+        if not value and self.__highlightCache is not None:
+            # only the occurrences that were highlighted need a repaint
+            self.viewport().update(_outlinedRegion(self.__highlightCache[1]))
+        else:
+            self.viewport().update()
+
+    def highlightMatchingOccurrencesMinLength(self):
+        """highlightMatchingOccurrencesMinLength()
+
+        Get the minimum length of the selected text for which matching
+        occurrences are highlighted.
+        """
+        return self.__highlightMatchingOccurrencesMinLength
+
+    @ce_option(2)
+    def setHighlightMatchingOccurrencesMinLength(self, value):
+        """setHighlightMatchingOccurrencesMinLength(value)
+
+        Set the minimum length of the selected text for which matching
+        occurrences are highlighted. Shorter selections, such as a single
+        letter, would typically give a lot of meaningless hits.
+        """
+        self.__highlightMatchingOccurrencesMinLength = int(value)
         self.viewport().update()
 
     def _doHighlight(self, text):
         if text.strip() != text or "\u2029" in text:
             # selection has leading/trailing whitespace or contains a line break
             return
+        if len(text) < self.__highlightMatchingOccurrencesMinLength:
+            return
+        if not self._wordCharPattern.search(text):
+            # selection consists of punctuation only
+            return
 
-        # make cursor at the beginning of the first visible block
-        cursor = self.cursorForPosition(QtCore.QPoint(0, 0))
-        cursor.movePosition(cursor.MoveOperation.StartOfWord)
-        doc = self.document()
+        # Reuse the rectangles of the previous paint if nothing relevant changed,
+        # the content offset is relative to the first visible block
+        selection = self.textCursor()
+        offset = self.contentOffset()
+        viewport = self.viewport()
+        key = (
+            text,
+            self.document().revision(),
+            selection.selectionStart(),
+            selection.selectionEnd(),
+            self.firstVisibleBlock().blockNumber(),
+            offset.x(),
+            offset.y(),
+            viewport.width(),
+            viewport.height(),
+        )
+        if self.__highlightCache is None or self.__highlightCache[0] != key:
+            rects = self.__findOccurrenceRects(text, selection, offset)
+            self.__highlightCache = key, rects
+        rects = self.__highlightCache[1]
+
+        if not rects:
+            return
 
         color = self.getStyleElementFormat("editor.highlightMatchingOccurrences").back
         painter = QtGui.QPainter()
-        painter.begin(self.viewport())
+        painter.begin(viewport)
         painter.setBrush(color)
         painter.setPen(color.darker(110))
+        painter.drawRects(rects)
+        painter.end()
 
-        # flag "FindWholeWords" in doc.find would not consider "_" as a word character
+    def __findOccurrenceRects(self, text, selection, offset):
+        """Get the (merged) rectangles of the visible occurrences of the given
+        text, excluding the selection itself.
+        """
+        # flag "FindWholeWords" of doc.find would not consider "_" as a word character
         # therefore use a custom regular expression instead
-        QRE = QtCore.QRegularExpression
-        needle = QRE(r"\b" + QRE.escape(text) + r"\b")
-
-        # find occurrences
-        for i in range(500):
-            cursor = doc.find(needle, cursor, doc.FindFlag.FindCaseSensitively)
-            if cursor is None or cursor.isNull():
-                # no more matches
-                break
-
-            # don't highlight the actual selection
-            if cursor == self.textCursor():
-                continue
+        # The compiled expression is kept until the selected text changes.
+        if text != self.__highlightNeedleText:
+            self.__highlightNeedleText = text
+            self.__highlightNeedle = re.compile(r"\b" + re.escape(text) + r"\b")
+        needle = self.__highlightNeedle
+
+        selectionStart = selection.selectionStart()
+        selectionEnd = selection.selectionEnd()
+
+        viewportHeight = self.viewport().height()
+
+        # find occurrences in the visible blocks, collecting the rectangles to paint
+        rects = []
+        block = self.firstVisibleBlock()
+        while block.isValid():
+            geometry = self.blockBoundingGeometry(block).translated(offset)
+            left, top = geometry.left(), geometry.top()
+            if top > viewportHeight:
+                break  # rest of document is not visible
+
+            # Compute the positions using the layout of the block, which is
+            # much cheaper than calling cursorRect() for each match
+            layout = block.layout()
+            blockPos = block.position()
+            for match in needle.finditer(block.text()):
+                start, end = match.span()
+
+                # don't highlight the actual selection
+                if (
+                    blockPos + start == selectionStart
+                    and blockPos + end == selectionEnd
+                ):
+                    continue
 
-            endRect = self.cursorRect(cursor)
-            cursor.setPosition(min(cursor.position(), cursor.anchor()))
-            startRect = self.cursorRect(cursor)
-
-            if startRect.top() > self.height():
-                # rest of document is not visible, don't bother highlighting
-                break
-
-            width = endRect.left() - startRect.left()
-            cursorHeight = startRect.height()
-
-            heightDiff = endRect.top() - startRect.top()
-            if heightDiff == 0:
-                painter.drawRect(startRect.left(), startRect.top(), width, cursorHeight)
-            elif heightDiff > 0:
-                cursor.movePosition(cursor.MoveOperation.EndOfLine)
-                secondLineY = self.cursorRect(cursor).top()
-                endLineY = endRect.top()
-                fullLineStartX = 0
-                fullLineEndX = self.width()
-
-                # first partial line
-                width = fullLineEndX - startRect.left()
-                painter.drawRect(startRect.left(), startRect.top(), width, cursorHeight)
-
-                # full lines in between
-                if endLineY > secondLineY:
-                    width = fullLineEndX - fullLineStartX
-                    height = endLineY - secondLineY
-                    painter.drawRect(fullLineStartX, secondLineY, width, height)
-
-                # last partial line
-                width = endRect.left() - fullLineStartX
-                if width > 0:
-                    painter.drawRect(fullLineStartX, endLineY, width, cursorHeight)
-
-            # move to end of word again, otherwise we never advance in the doc
-            cursor.movePosition(cursor.MoveOperation.EndOfWord)
-        else:
-            print("Matching selection highlighting did not break")
+                startLine = layout.lineForTextPosition(start)
+                endLine = layout.lineForTextPosition(end)
+                startX = _round(left + startLine.cursorToX(start)[0])
+                endX = _round(left + endLine.cursorToX(end)[0])
+                startY = _round(top + startLine.y())
+                cursorHeight = _round(top + startLine.y() + startLine.height()) - startY
 
-        painter.end()
+                if startLine.lineNumber() == endLine.lineNumber():
+                    rects.append(
+                        QtCore.QRect(startX, startY, endX - startX, cursorHeight)
+                    )
+                else:
+                    # the match is wrapped over multiple lines
+                    secondLineY = startY + cursorHeight
+                    endLineY = _round(top + endLine.y())
+                    fullLineStartX = 0
+                    fullLineEndX = self.width()
+
+                    # first partial line
+                    width = fullLineEndX - startX
+                    rects.append(QtCore.QRect(startX, startY, width, cursorHeight))
+
+                    # full lines in between
+                    if endLineY > secondLineY:
+                        width = fullLineEndX - fullLineStartX
+                        height = endLineY - secondLineY
+                        rects.append(
+                            QtCore.QRect(fullLineStartX, secondLineY, width, height)
+                        )
+
+                    # last partial line
+                    width = endX - fullLineStartX
+                    if width > 0:
+                        rects.append(
+                            QtCore.QRect(fullLineStartX, endLineY, width, cursorHeight)
+                        )
+
+            block = block.next()
+
+        return _mergeRowRects(rects) if rects else rects
 
     def paintEvent(self, event):
         """Paints behinds its super()."""
@@ -152,14 +292,16 @@ class _ParenIterator:
             raise _ParenNotFound
 
     def _getParenTokens(self):
+        bd = self.cur_block.userData()
         try:
-            return [
-                x
-                for x in self.cur_block.userData().tokens
-                if isinstance(x, ParenthesisToken)
-            ]
+            parenTokens = bd.parenTokens
         except AttributeError:
             return []  # can be a piece of text that we do not tokenize or have not stored tokens
+        if parenTokens is None:
+            # The highlighter resets the cache when it stores new tokens
+            parenTokens = [x for x in bd.tokens if isinstance(x, ParenthesisToken)]
+            bd.parenTokens = parenTokens
+        return parenTokens
 
     def __iter__(self):
         return self
@@ -184,31 +326,6 @@ class _ParenIterator:
         )
 
 
-class _PlainTextParenIterator:
-    """Iterates in given direction over parentheses in the document.
-    To be used when there is no parser.
-    Iteration gives both a parenthesis and its global position."""
-
-    def __init__(self, cursor, direction):
-        self.fulltext = cursor.document().toPlainText()
-        self.position = cursor.position() - 1
-        self.direction = direction
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        self.position += self.direction
-        try:
-            while self.fulltext[self.position] not in "([{)]}":
-                self.position += self.direction
-                if self.position < 0:
-                    raise StopIteration
-        except IndexError:
-            raise StopIteration
-        return self.fulltext[self.position], self.position + 1
-
-
 class _MatchStatus(enum.Enum):
     NoMatch = 0
     Match = 1
@@ -245,9 +362,67 @@ class HighlightMatchingBracket:
     _BRACKS_OPEN = "([{"
     _BRACKS_CLOSE = ")]}"
     _BRACKS = _BRACKS_OPEN + _BRACKS_CLOSE
+    _BRACKS_OPEN_SET = frozenset(_BRACKS_OPEN)
+    _BRACKS_CLOSE_SET = frozenset(_BRACKS_CLOSE)
     _matchingBrackets = dict(
         zip(_BRACKS_OPEN + _BRACKS_CLOSE, _BRACKS_CLOSE + _BRACKS_OPEN)  # noqa: B905
     )
+    _bracketsPattern = re.compile(r"[()\[\]{}]")
+
+    def __init__(self, *args, **kwds):
+        self.__plainTextMatches = None
+        self.__bracketRects = []  # the rectangles painted in the last paintEvent
+        self.__bracketWidths = {}  # char -> width, for __bracketWidthsFont
+        self.__bracketWidthsFont = None
+        super().__init__(*args, **kwds)
+        self.document().contentsChanged.connect(self.__onContentsChangedForBrackets)
+
+    def __onContentsChangedForBrackets(self):
+        self.__plainTextMatches = None
+
+    def _getPlainTextMatches(self):
+        """Get a dict that maps the position (right after the character) of
+        each bracket in the document to a tuple (status, corresponding,
+        offending), as _findMatchingBracket() would give it for that bracket.
+        To be used when there is no parser. The result is cached until the
+        document changes.
+        """
+        if self.__plainTextMatches is None:
+            brackets = [
+                (match.group(), match.end())
+                for match in self._bracketsPattern.finditer(self.toPlainText())
+            ]
+            matches = {}
+            # Opening brackets are matched going forward, closing brackets
+            # going backward, just like the parser-based search does
+            self._matchBracketsOneWay(brackets, self._BRACKS_OPEN_SET, matches)
+            self._matchBracketsOneWay(
+                reversed(brackets), self._BRACKS_CLOSE_SET, matches
+            )
+            self.__plainTextMatches = matches
+        return self.__plainTextMatches
+
+    def _matchBracketsOneWay(self, brackets, stacking, matches):
+        """Match the brackets of the stacking kind, walking over the given
+        (char, position) tuples once, and store the results in matches.
+        """
+        matchingBrackets = self._matchingBrackets
+        stack = []  # the brackets that are waiting for their match
+        for paren, pos in brackets:
+            if paren in stacking:
+                stack.append((paren, pos))
+            elif stack:
+                top_paren, top_pos = stack.pop()
+                if matchingBrackets[top_paren] == paren:
+                    matches[top_pos] = (_MatchStatus.Match, pos, None)
+                else:
+                    # All waiting brackets run into this one
+                    matches[top_pos] = (_MatchStatus.MisMatch, pos, top_pos)
+                    for _, waiting_pos in stack:
+                        matches[waiting_pos] = (_MatchStatus.MisMatch, pos, top_pos)
+                    stack.clear()
+        for _, waiting_pos in stack:
+            matches[waiting_pos] = (_MatchStatus.NoMatch, None, None)
 
     def highlightMatchingBracket(self):
         """Get whether to highlight matching brackets."""
@@ -257,7 +432,11 @@ class HighlightMatchingBracket:
     def setHighlightMatchingBracket(self, value):
         """Set whether to highlight matching brackets."""
         self.__highlightMatchingBracket = bool(value)
-        self.viewport().update()
+        if value:
+            self.viewport().update()
+        else:
+            # only the brackets that were highlighted need a repaint
+            self.viewport().update(_outlinedRegion(self.__bracketRects))
 
     def highlightMisMatchingBracket(self):
         """Get whether to highlight mismatching brackets."""
@@ -267,61 +446,79 @@ class HighlightMatchingBracket:
     def setHighlightMisMatchingBracket(self, value):
         """Set whether to highlight mismatching brackets."""
         self.__highlightMisMatchingBracket = bool(value)
-        self.viewport().update()
+        if value:
+            self.viewport().update()
+        else:
+            # only the brackets that were highlighted need a repaint
+            self.viewport().update(_outlinedRegion(self.__bracketRects))
 
-    def _highlightSingleChar(self, painter, cursor, width, colorname):
-        """Draws a highlighting rectangle around the single character to the
+    def _computeCharRect(self, cursor, width):
+        """Get the highlighting rectangle around the single character to the
         left of the specified cursor.
         """
         cursor_rect = self.cursorRect(cursor)
         top = cursor_rect.top()
         left = cursor_rect.left() - width
         height = cursor_rect.bottom() - top + 1
-        color = self.getStyleElementFormat(colorname).back
-        painter.setBrush(color)
-        painter.setPen(color.darker(110))
-        painter.drawRect(QtCore.QRect(int(left), int(top), int(width), int(height)))
+        return QtCore.QRect(int(left), int(top), int(width), int(height))
 
     def _findMatchingBracket(self, char, cursor):
         """Find a bracket that matches the specified char in the specified document.
         Return a _MatchResult object indicating whether this succeded and the
         positions of the parentheses causing this result.
         """
-        if char in self._BRACKS_CLOSE:
+        if char in self._BRACKS_CLOSE_SET:
             direction = -1
-            stacking = self._BRACKS_CLOSE
-            unstacking = self._BRACKS_OPEN
-        elif char in self._BRACKS_OPEN:
+            stacking = self._BRACKS_CLOSE_SET
+            unstacking = self._BRACKS_OPEN_SET
+        elif char in self._BRACKS_OPEN_SET:
             direction = 1
-            stacking = self._BRACKS_OPEN
-            unstacking = self._BRACKS_CLOSE
+            stacking = self._BRACKS_OPEN_SET
+            unstacking = self._BRACKS_CLOSE_SET
         else:
             raise ValueError("invalid bracket character: " + char)
 
+        if self.parser() is None or self.parser().name() == "":
+            # Without parser, all brackets in the document are matched at once
+            match = self._getPlainTextMatches().get(cursor.position())
+            if match is None:
+                return _MatchResult(_MatchStatus.NoMatch)
+            return _MatchResult(*match)
+
         stacked_paren = [(char, cursor.position())]  # using a Python list as a stack
         # stack not empty because the _ParenIterator will not give back
         # the parenthesis we're matching
-        our_iterator = (
-            _ParenIterator
-            if self.parser() is not None and self.parser().name() != ""
-            else _PlainTextParenIterator
-        )
-        for paren, pos in our_iterator(cursor, direction):
+        our_iterator = _ParenIterator(cursor, direction)
+
+        # Use locals in the loop, it can run over many brackets
+        matchingBrackets = self._matchingBrackets
+        push = stacked_paren.append
+        pop = stacked_paren.pop
+        for paren, pos in our_iterator:
             if paren in stacking:
-                stacked_paren.append((paren, pos))
+                push((paren, pos))
             elif paren in unstacking:
-                if self._matchingBrackets[stacked_paren[-1][0]] != paren:
-                    return _MatchResult(
-                        _MatchStatus.MisMatch, pos, stacked_paren[-1][1]
-                    )
-                else:
-                    stacked_paren.pop()
-
-            if len(stacked_paren) == 0:
-                # we've found our match
-                return _MatchResult(_MatchStatus.Match, pos)
+                top_paren, top_pos = stacked_paren[-1]
+                if matchingBrackets[top_paren] != paren:
+                    return _MatchResult(_MatchStatus.MisMatch, pos, top_pos)
+                pop()
+                if not stacked_paren:
+                    # we've found our match
+                    return _MatchResult(_MatchStatus.Match, pos)
         return _MatchResult(_MatchStatus.NoMatch)
 
+    def _getBracketWidth(self, font, char):
+        """Get the width of the given bracket character, cached per font."""
+        if font != self.__bracketWidthsFont:
+            self.__bracketWidths = {}
+            self.__bracketWidthsFont = font
+        try:
+            return self.__bracketWidths[char]
+        except KeyError:
+            width = QtGui.QFontMetrics(font).horizontalAdvance(char)
+            self.__bracketWidths[char] = width
+            return width
+
     def _cursorAt(self, doc, pos):
         new_cursor = QtGui.QTextCursor(doc)
         new_cursor.setPosition(pos)
@@ -334,6 +531,8 @@ class HighlightMatchingBracket:
         look for a matching one, and, if found, draw a highlighting rectangle
         around both brackets of the pair.
         """
+        self.__bracketRects = rects = []
+
         if not self.__highlightMatchingBracket:
             super().paintEvent(event)
             return
@@ -349,72 +548,67 @@ class HighlightMatchingBracket:
             movedRight = True
         else:
             movedRight = False
-        text = cursor.block().text()
-        pos = cursor.positionInBlock() - 1
-
-        if len(text) > pos and len(text) > 0:
-            # get the character to the left of the cursor
-            char = text[pos]
-
-            if not movedRight and char not in self._BRACKS and len(text) > pos + 1:
-                # no brace to the left of cursor; try to the right
-                cursor.movePosition(cursor.MoveOperation.Right)
-                char = text[pos + 1]
-
-            if char in self._BRACKS:
-                doc = cursor.document()
-                try:
-                    match_res = self._findMatchingBracket(char, cursor)
-                    fm = QtGui.QFontMetrics(doc.defaultFont())
-                    width = fm.horizontalAdvance(
-                        char
-                    )  # assumes that both paren have the same width
-                    painter = QtGui.QPainter()
-                    painter.begin(self.viewport())
-                    if match_res.status == _MatchStatus.NoMatch:
-                        self._highlightSingleChar(
-                            painter, cursor, width, "editor.highlightUnmatchedBracket"
-                        )
-                    elif match_res.status == _MatchStatus.Match:
-                        self._highlightSingleChar(
-                            painter, cursor, width, "editor.highlightMatchingBracket"
-                        )
-                        self._highlightSingleChar(
-                            painter,
+
+        # get the character to the left of the cursor, without getting the text
+        # of the whole block (which can be long)
+        doc = cursor.document()
+        pos = cursor.position() - 1
+        char = doc.characterAt(pos)  # gives a null character if pos < 0
+
+        if not movedRight and char not in self._BRACKS and not cursor.atBlockEnd():
+            # no brace to the left of cursor; try to the right
+            cursor.movePosition(cursor.MoveOperation.Right)
+            char = doc.characterAt(pos + 1)
+
+        if char in self._BRACKS:
+            try:
+                match_res = self._findMatchingBracket(char, cursor)
+                # assumes that both paren have the same width
+                width = self._getBracketWidth(doc.defaultFont(), char)
+                # collect the rectangles per color, to draw them in one go
+                rectsPerColor = {}
+
+                def addRect(cursor, colorname):
+                    rect = self._computeCharRect(cursor, width)
+                    rectsPerColor.setdefault(colorname, []).append(rect)
+                    rects.append(rect)
+
+                if match_res.status == _MatchStatus.NoMatch:
+                    addRect(cursor, "editor.highlightUnmatchedBracket")
+                elif match_res.status == _MatchStatus.Match:
+                    addRect(cursor, "editor.highlightMatchingBracket")
+                    addRect(
+                        self._cursorAt(doc, match_res.corresponding),
+                        "editor.highlightMatchingBracket",
+                    )
+                else:  # this is a mismatch
+                    if (
+                        cursor.position() != match_res.offending
+                        or not self.highlightMisMatchingBracket()
+                    ):
+                        addRect(cursor, "editor.highlightUnmatchedBracket")
+                    if self.highlightMisMatchingBracket():
+                        addRect(
                             self._cursorAt(doc, match_res.corresponding),
-                            width,
-                            "editor.highlightMatchingBracket",
+                            "editor.highlightMisMatchingBracket",
+                        )
+                        addRect(
+                            self._cursorAt(doc, match_res.offending),
+                            "editor.highlightMisMatchingBracket",
                         )
-                    else:  # this is a mismatch
-                        if (
-                            cursor.position() != match_res.offending
-                            or not self.highlightMisMatchingBracket()
-                        ):
-                            self._highlightSingleChar(
-                                painter,
-                                cursor,
-                                width,
-                                "editor.highlightUnmatchedBracket",
-                            )
-                        if self.highlightMisMatchingBracket():
-                            self._highlightSingleChar(
-                                painter,
-                                self._cursorAt(doc, match_res.corresponding),
-                                width,
-                                "editor.highlightMisMatchingBracket",
-                            )
-                            self._highlightSingleChar(
-                                painter,
-                                self._cursorAt(doc, match_res.offending),
-                                width,
-                                "editor.highlightMisMatchingBracket",
-                            )
-
-                    painter.end()
-                except _ParenNotFound:
-                    # is raised when current parenthesis is not
-                    # found in its line token list, meaning it is in a string literal
-                    pass
+
+                painter = QtGui.QPainter()
+                painter.begin(self.viewport())
+                for colorname, colorRects in rectsPerColor.items():
+                    color = self.getStyleElementFormat(colorname).back
+                    painter.setBrush(color)
+                    painter.setPen(color.darker(110))
+                    painter.drawRects(colorRects)
+                painter.end()
+            except _ParenNotFound:
+                # is raised when current parenthesis is not
+                # found in its line token list, meaning it is in a string literal
+                pass
 
         super().paintEvent(event)
 
@@ -433,6 +627,16 @@ class HighlightCurrentLine:
         )
     ]
 
+    def __init__(self, *args, **kwds):
+        self.__currentLineRect = QtCore.QRect()  # the rectangle painted last
+        self.__currentLineKey = None  # what __currentLineRect was computed for
+        super().__init__(*args, **kwds)
+        # The cached rectangle is invalid when the layout changes
+        self.document().documentLayout().update.connect(self.__clearCurrentLineKey)
+
+    def __clearCurrentLineKey(self, *args):
+        self.__currentLineKey = None
+
     def highlightCurrentLine(self):
         """Get whether to highlight the current line."""
         return self.__highlightCurrentLine
@@ -441,7 +645,11 @@ class HighlightCurrentLine:
     def setHighlightCurrentLine(self, value):
         """Set whether to highlight the current line."""
         self.__highlightCurrentLine = bool(value)
-        self.viewport().update()
+        if value:
+            self.viewport().update()
+        else:
+            # only the line that was highlighted needs a repaint
+            self.viewport().update(self.__currentLineRect)
 
     def paintEvent(self, event):
         """Paints behind its super()
@@ -456,25 +664,38 @@ class HighlightCurrentLine:
         # Get color
         color = self.getStyleElementFormat("editor.highlightCurrentLine").back
 
-        # Find the top of the current block, and the height
+        # The rectangle only needs to be computed again if the current block,
+        # the scroll position, the viewport size or the layout changed. Note that
+        # the content offset is relative to the first visible block.
         cursor = self.textCursor()
-        cursor.movePosition(cursor.MoveOperation.StartOfBlock)
-        top = self.cursorRect(cursor).top()
-        cursor.movePosition(cursor.MoveOperation.EndOfBlock)
-        height = self.cursorRect(cursor).bottom() - top + 1
-
-        margin = self.document().documentMargin()
-        painter = QtGui.QPainter()
-        painter.begin(self.viewport())
-        painter.fillRect(
-            QtCore.QRect(
+        offset = self.contentOffset()
+        key = (
+            cursor.blockNumber(),
+            self.firstVisibleBlock().blockNumber(),
+            offset.x(),
+            offset.y(),
+            self.viewport().width(),
+        )
+        if key != self.__currentLineKey:
+            # Find the top of the current block, and the height
+            cursor.movePosition(cursor.MoveOperation.StartOfBlock)
+            top = self.cursorRect(cursor).top()
+            cursor.movePosition(cursor.MoveOperation.EndOfBlock)
+            height = self.cursorRect(cursor).bottom() - top + 1
+
+            margin = self.document().documentMargin()
+            self.__currentLineRect = QtCore.QRect(
                 int(margin),
                 int(top),
                 int(self.viewport().width() - 2 * margin),
                 int(height),
-            ),
-            color,
-        )
+            )
+            self.__currentLineKey = key
+        rect = self.__currentLineRect
+
+        painter = QtGui.QPainter()
+        painter.begin(self.viewport())
+        painter.fillRect(rect, color)
         painter.end()
 
         super().paintEvent(event)
@@ -530,24 +751,36 @@ class IndentationGuides:
 
         # Prepare pen
         format = self.getStyleElementFormat("editor.IndentationGuides")
-        pen = QtGui.QPen(format.fore)
-        pen.setStyle(format.linestyle)
-        painter.setPen(pen)
+        painter.setPen(format.pen)
         offset = doc.documentMargin() + self.contentOffset().x()
 
+        # Measure a single character, the guides are placed at multiples of it.
+        # For a monospace font, rounding the product gives the same result as
+        # measuring the whole string.
+        iAdvance = QtGui.QFontMetricsF(self.font()).horizontalAdvance("i")
+
+        # Collect the lines, so they can be drawn in one go
+        lines = []
+        viewportHeight = viewport.height()
+
         def paintIndentationGuides(cursor):
-            y3 = self.cursorRect(cursor).top()
-            y4 = self.cursorRect(cursor).bottom()
+            cursorRect = self.cursorRect(cursor)
+            y3 = cursorRect.top()
+            y4 = cursorRect.bottom()
+            if y3 > viewportHeight:
+                return False  # this and the next blocks are not visible
 
             bd = cursor.block().userData()
             if bd and hasattr(bd, "indentation") and bd.indentation:
                 for x in range(indentWidth, bd.indentation * factor, indentWidth):
-                    w = self.fontMetrics().horizontalAdvance("i" * x) + offset
+                    w = _round(iAdvance * x) + offset
                     w += 1  # Put it more under the block
                     if w > 0:  # if scrolled horizontally it can become < 0
-                        painter.drawLine(QtCore.QLine(int(w), int(y3), int(w), int(y4)))
+                        lines.append(QtCore.QLine(int(w), int(y3), int(w), int(y4)))
 
         self.doForVisibleBlocks(paintIndentationGuides)
+        if lines:
+            painter.drawLines(lines)
 
         # Done
         painter.end()
@@ -566,24 +799,33 @@ class FullUnderlines:
 
         margin = self.document().documentMargin()
         w = self.viewport().width()
+        viewportHeight = self.viewport().height()
+
+        # Collect the lines per format, so they can be drawn in one go
+        linesPerFormat = {}
 
         def paintUnderline(cursor):
             y = self.cursorRect(cursor).bottom()
+            if y > viewportHeight:
+                return False  # this and the next blocks are not visible
             fullUnderlineFormat = getattr(
                 cursor.block().userData(), "fullUnderlineFormat", None
             )
             if fullUnderlineFormat is not None:
-                # Apply pen
-                pen = QtGui.QPen(fullUnderlineFormat.fore)
-                pen.setStyle(fullUnderlineFormat.linestyle)
-                painter.setPen(pen)
-                # Paint
-                painter.drawLine(
-                    QtCore.QLine(int(margin), int(y), int(w - 2 * margin), int(y))
+                line = QtCore.QLine(int(margin), int(y), int(w - 2 * margin), int(y))
+                key = id(fullUnderlineFormat)
+                linesPerFormat.setdefault(key, (fullUnderlineFormat, []))[1].append(
+                    line
                 )
 
         self.doForVisibleBlocks(paintUnderline)
 
+        for fullUnderlineFormat, lines in linesPerFormat.values():
+            # Apply pen
+            painter.setPen(fullUnderlineFormat.pen)
+            # Paint
+            painter.drawLines(lines)
+
         painter.end()
 
 
@@ -652,10 +894,10 @@ class LongLineIndicator:
         viewport = self.viewport()
 
         # Get position of long line
-        fm = self.fontMetrics()
-        # horizontalAdvance of ('i'*length) not length * (horizontalAdvance of 'i') b/c of
-        # font kerning and rounding
-        x = fm.horizontalAdvance("i" * self.longLineIndicatorPosition())
+        # Use the unrounded advance of a single character, so that rounding
+        # errors do not add up over the length of the line
+        fm = QtGui.QFontMetricsF(self.font())
+        x = _round(fm.horizontalAdvance("i") * self.longLineIndicatorPosition())
         x += doc.documentMargin() + self.contentOffset().x()
         x += 1  # Move it a little next to the cursor
 
@@ -665,9 +907,7 @@ class LongLineIndicator:
 
         # Prepare pen
         format = self.getStyleElementFormat("editor.LongLineIndicator")
-        pen = QtGui.QPen(format.fore)
-        pen.setStyle(format.linestyle)
-        painter.setPen(pen)
+        painter.setPen(format.pen)
 
         # Draw line and end painter
         painter.drawLine(QtCore.QLine(int(x), 0, int(x), int(viewport.height())))
@@ -739,11 +979,18 @@ class LineNumbers:
     class __LineNumberArea(QtWidgets.QWidget):
         """This is the widget reponsible for drawing the line numbers."""
 
+        # Max number of cached static texts per font. When exceeded, the cache
+        # is cleared, so it holds about the lines that were shown recently.
+        _maxStaticTexts = 500
+
         def __init__(self, codeEditor):
             super().__init__(codeEditor)
             self.setCursor(QtCore.Qt.CursorShape.PointingHandCursor)
             self._pressedY = None
             self._lineNrChoser = None
+            self._fonts = None  # (normal, bold), reset when the font changes
+            self._staticTexts = {}  # line number -> QStaticText, for the normal font
+            self._staticTextsBold = {}  # idem, for the bold font
 
         def _getY(self, pos):
             tmp = self.mapToGlobal(pos)
@@ -797,6 +1044,21 @@ class LineNumbers:
             # Show/reset line number choser
             self._lineNrChoser.reset(cursor.blockNumber() + 1)
 
+        def _getStaticText(self, lineNumber, font, cache):
+            """Get a QStaticText for the given line number from the given
+            cache, so that the text does not need to be laid out again on
+            each paint. The painter must use the same font when drawing it.
+            """
+            try:
+                return cache[lineNumber]
+            except KeyError:
+                if len(cache) >= self._maxStaticTexts:
+                    cache.clear()
+                staticText = QtGui.QStaticText(str(lineNumber))
+                staticText.prepare(QtGui.QTransform(), font)
+                cache[lineNumber] = staticText
+                return staticText
+
         def paintEvent(self, event):
             editor = self.parent()
 
@@ -826,45 +1088,64 @@ class LineNumbers:
             # Draw the background
             painter.fillRect(QtCore.QRect(0, int(y1), int(w), int(y2)), format.back)
 
-            # Get cursor
-            cursor = editor.cursorForPosition(QtCore.QPoint(0, int(y1)))
+            # Get the first visible block, Qt knows which one that is
+            block = editor.firstVisibleBlock()
+            contentOffset = editor.contentOffset()
 
             # Prepare fonts
-            font1 = editor.font()
-            font2 = editor.font()
-            font2.setBold(True)
+            if self._fonts is None:
+                font1 = editor.font()
+                font2 = editor.font()
+                font2.setBold(True)
+                self._fonts = font1, font2
+            font1, font2 = self._fonts
             currentBlockNumber = editor.textCursor().block().blockNumber()
 
             # Init painter with font and color
             painter.setFont(font1)
             painter.setPen(format.fore)
+            textWidth = w - margin
+            currentY = None
+
+            # Use locals in the loop, it runs for each visible line
+            blockBoundingGeometry = editor.blockBoundingGeometry
+            getStaticText = self._getStaticText
+            staticTexts = self._staticTexts
+            drawStaticText = painter.drawStaticText
+            QPointF = QtCore.QPointF
 
             # Repainting always starts at the first block in the viewport,
             # regardless of the event.rect().y(). Just to keep it simple
+            # The blocks are walked directly, which is cheaper than moving a cursor
             while True:
-                blockNumber = cursor.block().blockNumber()
-
-                y = editor.cursorRect(cursor).y()
-
-                # Set font to bold if line number is the current
-                if blockNumber == currentBlockNumber:
-                    painter.setFont(font2)
+                blockNumber = block.blockNumber()
 
-                AF = Qt.AlignmentFlag
-                painter.drawText(
-                    0, y - offset, w - margin, 50, AF.AlignRight, str(blockNumber + 1)
-                )
+                top = blockBoundingGeometry(block).translated(contentOffset).top()
+                y = _round(top)
 
-                # Set font back
                 if blockNumber == currentBlockNumber:
-                    painter.setFont(font1)
+                    # Drawn below, so the font is only changed once
+                    currentY = y
+                else:
+                    # Draw right aligned, the static text is already laid out
+                    staticText = getStaticText(blockNumber + 1, font1, staticTexts)
+                    x = textWidth - staticText.size().width()
+                    drawStaticText(QPointF(x, y - offset), staticText)
 
                 if y > y2:
                     break  # Reached end of the repaint area
-                if not cursor.block().next().isValid():
+                block = block.next()
+                if not block.isValid():
                     break  # Reached end of the text
 
-                cursor.movePosition(cursor.MoveOperation.NextBlock)
+            # Draw the current line number in bold
+            if currentY is not None:
+                painter.setFont(font2)
+                staticText = self._getStaticText(
+                    currentBlockNumber + 1, font2, self._staticTextsBold
+                )
+                x = textWidth - staticText.size().width()
+                painter.drawStaticText(QPointF(x, currentY - offset), staticText)
 
             # Done
             painter.end()
@@ -922,12 +1203,14 @@ class LineNumbers:
     def __init__(self, *args, **kwds):
         self.__lineNumberArea = None
         self.__leftMarginHandle = None
+        self.__lineNumberAreaWidth = None  # (digits, width)
+        self.__lineNumberAreaScrollKey = None
         super().__init__(*args, **kwds)
         # Create widget that draws the line numbers
         self.__lineNumberArea = self.__LineNumberArea(self)
         # Issue an update when the font or amount of line numbers changes
         self.blockCountChanged.connect(self.__onBlockCountChanged)
-        self.fontChanged.connect(self.__onBlockCountChanged)
+        self.fontChanged.connect(self.__onFontChanged)
         self.__leftMarginHandle = self._setLeftBarMargin(
             self.__leftMarginHandle, self._getLineNumberAreaWidth()
         )
@@ -959,13 +1242,27 @@ class LineNumbers:
 
     def _getLineNumberAreaWidth(self):
         """Count the number of lines, compute the length of the longest line number
-        (in pixels)
+        (in pixels), assuming that all digits are equally wide (which they are in
+        a monospace font)
         """
         if not self.__showLineNumbers:
             return 0
-        lastLineNumber = self.blockCount()
-        margin = self._LineNumberAreaMargin
-        return self.fontMetrics().horizontalAdvance(str(lastLineNumber)) + 2 * margin
+        digits = len(str(self.blockCount()))
+        # This is called on each paint, so measure only when the number of
+        # digits changes. Measure the widest number with that many digits.
+        cache = self.__lineNumberAreaWidth
+        if cache is None or cache[0] != digits:
+            margin = self._LineNumberAreaMargin
+            width = self.fontMetrics().horizontalAdvance("9" * digits)
+            cache = self.__lineNumberAreaWidth = digits, width + 2 * margin
+        return cache[1]
+
+    def __onFontChanged(self):
+        self.__lineNumberAreaWidth = None
+        self.__lineNumberArea._fonts = None
+        self.__lineNumberArea._staticTexts = {}
+        self.__lineNumberArea._staticTextsBold = {}
+        self.__onBlockCountChanged()
 
     def __onBlockCountChanged(self, count=None):
         """Update the line number area width. This requires to set the
@@ -987,9 +1284,13 @@ class LineNumbers:
 
     def paintEvent(self, event):
         super().paintEvent(event)
-        # On repaint, update the complete line number area
+        if not self.__showLineNumbers:
+            return  # the area is hidden
+        # On repaint, update the line number area next to the repainted part
         w = self._getLineNumberAreaWidth()
-        self.__lineNumberArea.update(0, 0, w, self.height())
+        self.__lineNumberAreaScrollKey = _updateSideBar(
+            self, self.__lineNumberArea, w, event, self.__lineNumberAreaScrollKey
+        )
 
 
 class BreakPoints:
@@ -1010,6 +1311,8 @@ class BreakPoints:
             self.setCursor(QtCore.Qt.CursorShape.PointingHandCursor)
             self.setMouseTracking(True)
             self._virtualBreakpoint = 0
+            self._bulletPixmaps = {}  # kind -> QPixmap, for _bulletPixmapsKey
+            self._bulletPixmapsKey = None
 
         def _getY(self, pos):
             tmp = self.mapToGlobal(pos)
@@ -1037,116 +1340,151 @@ class BreakPoints:
             # Toggle
             self.parent().toggleBreakpoint(linenr)
 
+        def _getBulletPixmap(self, kind, bulletWidth, format):
+            """Get a pixmap with the bullet of the given kind pre-rendered,
+            so that it can be blitted for each breakpoint. The pixmap has a
+            border of one pixel around the bullet, to leave room for the pen.
+            """
+            key = bulletWidth, format.fore.rgba(), self.devicePixelRatioF()
+            if key != self._bulletPixmapsKey:
+                self._bulletPixmaps = {}
+                self._bulletPixmapsKey = key
+            try:
+                return self._bulletPixmaps[kind]
+            except KeyError:
+                pass
+
+            # Create transparent pixmap
+            dpr = key[2]
+            size = bulletWidth + 2
+            pixmap = QtGui.QPixmap(math.ceil(size * dpr), math.ceil(size * dpr))
+            pixmap.setDevicePixelRatio(dpr)
+            pixmap.fill(QtCore.Qt.GlobalColor.transparent)
+
+            # Paint the bullet
+            painter = QtGui.QPainter()
+            painter.begin(pixmap)
+            painter.setRenderHint(painter.RenderHint.Antialiasing)
+            painter.setPen(QtGui.QColor("#777"))
+            if kind == "enabled":
+                painter.setBrush(format.fore)
+                painter.drawEllipse(1, 1, bulletWidth, bulletWidth)
+            elif kind == "disabled":
+                painter.setBrush(format.fore)
+                painter.drawPie(1, 1, bulletWidth, bulletWidth, 90 * 16, 180 * 16)
+            elif kind == "debug":
+                painter.setBrush(QtGui.QColor("#6F6"))
+                painter.drawEllipse(1, 1, bulletWidth, int(0.5 * bulletWidth))
+            elif kind == "otherDebug":
+                painter.setBrush(QtGui.QColor("#DDD"))
+                painter.drawEllipse(1, 1, bulletWidth, int(0.5 * bulletWidth))
+            elif kind == "virtual":
+                painter.setBrush(QtGui.QColor(0, 0, 0, 0))
+                painter.drawEllipse(1, 1, bulletWidth, bulletWidth)
+            painter.end()
+
+            self._bulletPixmaps[kind] = pixmap
+            return pixmap
+
         def paintEvent(self, event):
             editor = self.parent()
 
             if not editor.showBreakPoints():
                 return
 
-            # Get format and margin
+            # Get format and width
             format = editor.getStyleElementFormat("editor.breakpoints")
             w = editor._breakPointWidth
-            marginX = max(1, int(0.1 * w))
-            bulletWidth = w - 2 * marginX
-
-            # Init painter
-            painter = QtGui.QPainter()
-            painter.begin(self)
 
             # Get which part to paint. Just do all to avoid glitches
             y1, y2 = 0, editor.height()
 
-            # Draw the background
-            painter.fillRect(QtCore.QRect(0, int(y1), int(w), int(y2)), format.back)
-
             # Get debug indicator and list of sorted breakpoints
             debugBlockIndicator = editor._debugLineIndicator - 1
             virtualBreakpoint = self._virtualBreakpoint - 1
-            breakpoints = self.parent()._breakPoints
-            if not (
+            breakpoints = editor._bpEnabled
+            hasContent = (
                 len(breakpoints) > 0
                 or editor._debugLineIndicator
                 or editor._debugLineIndicators
                 or virtualBreakpoint > 0
-            ):
-                return
+            )
+
+            # Init painter and draw the background
+            painter = QtGui.QPainter()
+            painter.begin(self)
+            painter.fillRect(QtCore.QRect(0, int(y1), int(w), int(y2)), format.back)
+            if not hasContent:
+                painter.end()
+                return  # only the background, the common case
+
+            # Get bullet size and margin
+            marginX = max(1, int(0.1 * w))
+            bulletWidth = w - 2 * marginX
 
-            # Get cursor
-            cursor = editor.cursorForPosition(QtCore.QPoint(0, int(y1)))
+            # Get the first visible block, Qt knows which one that is
+            block = editor.firstVisibleBlock()
 
             # Get start block number and bullet offset in pixels
-            startBlockNumber = cursor.block().blockNumber()
-            marginY = int(0.5 * (editor.cursorRect(cursor).height() - bulletWidth))
+            startBlockNumber = block.blockNumber()
+            marginY = int(0.5 * (editor._breakPointLineHeight - bulletWidth))
             bulletOffset = editor.contentOffset().y() + marginY
-            # Prepare painter
-            painter.setPen(QtGui.QColor("#777"))
-            painter.setBrush(format.fore)
-            painter.setRenderHint(painter.RenderHint.Antialiasing)
-
-            # Draw breakpoints
-            for linenr, (enabled, *_) in sorted(breakpoints.items()):
-                blockNumber = linenr - 1
-                if blockNumber < startBlockNumber:
-                    continue
-                # Get block
-                block = editor.document().findBlockByNumber(blockNumber)
-                if block.isValid():
-                    y = editor.blockBoundingGeometry(block).y() + bulletOffset
-                    if enabled:
-                        painter.drawEllipse(
-                            marginX, int(y), int(bulletWidth), int(bulletWidth)
-                        )
-                    else:
-                        painter.drawPie(
-                            marginX,
-                            int(y),
-                            int(bulletWidth),
-                            int(bulletWidth),
-                            90 * 16,
-                            180 * 16,
-                        )
+            # The bullets are pre-rendered, with a border for the pen
+            x = marginX - 1
+
+            # Get the bullet positions of all visible blocks in one pass
+            blockBoundingGeometry = editor.blockBoundingGeometry
+            ys = {}  # blockNumber -> y
+            while block.isValid():
+                y = blockBoundingGeometry(block).y() + bulletOffset
+                if y > y2:
+                    break  # Reached end of the repaint area
+                ys[block.blockNumber()] = y
+                block = block.next()
+
+            # Draw breakpoints, starting at the first visible one
+            drawPixmap = painter.drawPixmap
+            enabledPixmap = self._getBulletPixmap("enabled", bulletWidth, format)
+            disabledPixmap = self._getBulletPixmap("disabled", bulletWidth, format)
+            lines = editor._breakPointLines
+            for i in range(bisect.bisect_left(lines, startBlockNumber + 1), len(lines)):
+                linenr = lines[i]
+                y = ys.get(linenr - 1)
+                if y is None:
+                    break  # This and the next breakpoints are not visible
+                if breakpoints[linenr]:
+                    drawPixmap(x, int(y) - 1, enabledPixmap)
+                else:
+                    drawPixmap(x, int(y) - 1, disabledPixmap)
 
             # Draw *the* debug marker
-            if debugBlockIndicator >= 0:
-                painter.setBrush(QtGui.QColor("#6F6"))
-                # Get block
-                block = editor.document().findBlockByNumber(debugBlockIndicator)
-                if block.isValid():
-                    y = editor.blockBoundingGeometry(block).y() + bulletOffset
-                    y += 0.25 * bulletWidth
-                    painter.drawEllipse(
-                        marginX, int(y), int(bulletWidth), int(0.5 * bulletWidth)
-                    )
+            y = ys.get(debugBlockIndicator)
+            if y is not None:
+                y += 0.25 * bulletWidth
+                pixmap = self._getBulletPixmap("debug", bulletWidth, format)
+                drawPixmap(x, int(y) - 1, pixmap)
 
             # Draw other debug markers
             for debugLineIndicator in editor._debugLineIndicators:
-                debugBlockIndicator = debugLineIndicator - 1
-                painter.setBrush(QtGui.QColor("#DDD"))
-                # Get block
-                block = editor.document().findBlockByNumber(debugBlockIndicator)
-                if block.isValid():
-                    y = editor.blockBoundingGeometry(block).y() + bulletOffset
+                y = ys.get(debugLineIndicator - 1)
+                if y is not None:
                     y += 0.25 * bulletWidth
-                    painter.drawEllipse(
-                        marginX, int(y), int(bulletWidth), int(0.5 * bulletWidth)
-                    )
+                    pixmap = self._getBulletPixmap("otherDebug", bulletWidth, format)
+                    drawPixmap(x, int(y) - 1, pixmap)
 
             # Draw virtual break point
             if virtualBreakpoint > 0:
-                painter.setBrush(QtGui.QColor(0, 0, 0, 0))
-                # Get block
-                block = editor.document().findBlockByNumber(virtualBreakpoint)
-                if block.isValid():
-                    y = editor.blockBoundingGeometry(block).y() + bulletOffset
-                    painter.drawEllipse(
-                        marginX, int(y), int(bulletWidth), int(bulletWidth)
-                    )
+                y = ys.get(virtualBreakpoint)
+                if y is not None:
+                    pixmap = self._getBulletPixmap("virtual", bulletWidth, format)
+                    drawPixmap(x, int(y) - 1, pixmap)
 
             # Done
             painter.end()
 
     def __init__(self, *args, **kwds):
         self.__breakPointArea = None
+        self.__breakPointAreaScrollKey = None
         self.__leftMarginHandle = None
         super().__init__(*args, **kwds)
         # Create widget that draws the breakpoints
@@ -1155,26 +1493,52 @@ class BreakPoints:
         self.__leftMarginHandle = self._setLeftBarMargin(
             self.__leftMarginHandle, self._getBreakPointAreaWidth()
         )
-        self._breakPoints = {}  # int -> enabled, block, blockPrev, blockNext
+        # The breakpoints are stored in separate dicts, keyed by line number,
+        # so that painting only needs to look at _bpEnabled
+        self._bpEnabled = {}  # int -> enabled
+        self._bpBlock = {}  # int -> block
+        self._bpPrev = {}  # int -> block.previous() when the block was stored
+        self._bpNext = {}  # int -> block.next() when the block was stored
+        self._breakPointLines = []  # the line numbers of the breakpoints, sorted
         self._debugLineIndicator = 0
         self._debugLineIndicators = set()
         self.blockCountChanged.connect(self.__onBlockCountChanged)
 
+    def __setBreakPoint(self, linenr, enabled, block):
+        """Store a breakpoint, together with the references to the neighbouring
+        blocks. Does not update _breakPointLines.
+        """
+        self._bpEnabled[linenr] = enabled
+        self._bpBlock[linenr] = block
+        self._bpPrev[linenr] = block.previous()
+        self._bpNext[linenr] = block.next()
+
+    def __popBreakPoint(self, linenr):
+        """Remove a breakpoint and return (enabled, block). Does not update
+        _breakPointLines.
+        """
+        del self._bpPrev[linenr]
+        del self._bpNext[linenr]
+        return self._bpEnabled.pop(linenr), self._bpBlock.pop(linenr)
+
     def __onBlockCountChanged(self):
         """Track breakpoints so we can update the number when text is inserted
         above.
         """
+        if not self._bpEnabled:
+            return  # the common case, nothing to track
+
         newBreakPoints = {}
         breakPointDeleted = False
 
-        for linenr in list(self._breakPoints):
-            enabled, block, block_previous, block_next = self._breakPoints[linenr]
+        for linenr in list(self._bpEnabled):
+            block = self._bpBlock[linenr]
 
             # Apparently there is a bug in Qt5 and Qt6 that can cause a segmentation fault.
             # When there is a faulty block "block.previous()", calling methods such as
             # "block.previous().blockNumber()" will crash Pyzo immediately.
             # These crashes happend sometimes after Qt re-created a block and we still
-            # have the outdated block reference in our self._breakPoints dictionary.
+            # have the outdated block reference in our self._bpBlock dictionary.
             # Such a block re-creation will happen for example during undo operations, but
             # also when a block is merged with a previous empty one (by pressing backspace
             # at the beginning of a line below an empty line).
@@ -1182,7 +1546,7 @@ class BreakPoints:
             #
             # So, to avoid crashes, we discard breakpoints that had their block re-created.
             # To detect if the block was re-created, we check if its userData was reset
-            # to None. When adding a block to "self._breakPoints", we make sure it has
+            # to None. When adding a block to "self._bpBlock", we make sure it has
             # userData set to something different than None.
             #
             # According to the Qt docs from https://doc.qt.io/qt-6/qtextblock.html:
@@ -1191,15 +1555,17 @@ class BreakPoints:
 
             if block.userData() is None:
                 # The block assigned to the breakpoint was re-created by Qt after we
-                # added it to the self._breakPoints dict.
+                # added it to the self._bpBlock dict.
                 # To avoid a crash we delete the breakpoint.
-                del self._breakPoints[linenr]
+                self.__popBreakPoint(linenr)
                 breakPointDeleted = True
                 continue
 
             block_linenr = block.blockNumber() + 1
-            prev_ok = block.previous().blockNumber() == block_previous.blockNumber()
-            next_ok = block.next().blockNumber() == block_next.blockNumber()
+            prev_ok = (
+                block.previous().blockNumber() == self._bpPrev[linenr].blockNumber()
+            )
+            next_ok = block.next().blockNumber() == self._bpNext[linenr].blockNumber()
 
             if prev_ok or next_ok:
                 if block_linenr == linenr:
@@ -1207,45 +1573,37 @@ class BreakPoints:
                         pass  # All is well
                     else:
                         # Update refs
-                        self._breakPoints[linenr] = (
-                            enabled,
-                            block,
-                            block.previous(),
-                            block.next(),
-                        )
+                        self._bpPrev[linenr] = block.previous()
+                        self._bpNext[linenr] = block.next()
                 else:
                     # Update linenr -- this is the only case where we "move" the breakpoint
-                    newBreakPoints[block_linenr] = self._breakPoints.pop(linenr)
+                    newBreakPoints[block_linenr] = self.__popBreakPoint(linenr)
                     breakPointDeleted = True
             else:
                 if block_linenr == linenr:
                     # Just update refs
-                    self._breakPoints[linenr] = (
-                        enabled,
-                        block,
-                        block.previous(),
-                        block.next(),
-                    )
+                    self._bpPrev[linenr] = block.previous()
+                    self._bpNext[linenr] = block.next()
                 else:
                     # unexpected --> delete breakpoint
-                    del self._breakPoints[linenr]
+                    self.__popBreakPoint(linenr)
                     breakPointDeleted = True
 
         if newBreakPoints or breakPointDeleted:
-            self._breakPoints.update(newBreakPoints)
+            for linenr, (enabled, block) in newBreakPoints.items():
+                self.__setBreakPoint(linenr, enabled, block)
+            self._breakPointLines = sorted(self._bpEnabled)
             self.breakPointsChanged.emit(self)
             self.__breakPointArea.update()
 
     def breakPoints(self, triState=False):
         """A list of breakpoints for this editor."""
+        # The line numbers are kept sorted, so no need to sort here
+        enabled = self._bpEnabled
         if triState:
-            return sorted(
-                (linenr, enabled) for linenr, (enabled, *_) in self._breakPoints.items()
-            )
+            return [(linenr, enabled[linenr]) for linenr in self._breakPointLines]
         else:
-            return sorted(
-                linenr for linenr, (enabled, *_) in self._breakPoints.items() if enabled
-            )
+            return [linenr for linenr in self._breakPointLines if enabled[linenr]]
 
     def clearBreakPoints(self):
         """Remove all breakpoints for this editor."""
@@ -1257,8 +1615,10 @@ class BreakPoints:
         if linenr is None:
             linenr = self.textCursor().blockNumber() + 1
 
-        if linenr in self._breakPoints:
-            enabled, b, bPrev, bNext = self._breakPoints.pop(linenr)
+        if linenr in self._bpEnabled:
+            enabled, b = self.__popBreakPoint(linenr)
+            lines = self._breakPointLines
+            lines.pop(bisect.bisect_left(lines, linenr))
             if triState and enabled:
                 enabled = False
             else:
@@ -1269,8 +1629,6 @@ class BreakPoints:
             c.movePosition(c.MoveOperation.Start)
             c.movePosition(c.MoveOperation.NextBlock, c.MoveMode.MoveAnchor, linenr - 1)
             b = c.block()
-            bPrev = b.previous()
-            bNext = b.next()
 
         if b is not None:
             # As described in method "__onBlockCountChanged", we want to make sure that
@@ -1282,28 +1640,25 @@ class BreakPoints:
                     QtGui.QTextBlockUserData()
                 )  # just something other than None
 
-            self._breakPoints[linenr] = enabled, b, bPrev, bNext
+            self.__setBreakPoint(linenr, enabled, b)
+            bisect.insort(self._breakPointLines, linenr)
 
         self.breakPointsChanged.emit(self)
         self.__breakPointArea.update()
 
     def jumpPreviousBreakpoint(self):
         currentLinenr = self.textCursor().blockNumber() + 1
-        newLinenr = max(
-            (linenr for linenr in self._breakPoints if linenr < currentLinenr),
-            default=None,
-        )
-        if newLinenr is not None:
-            self.gotoLine(newLinenr, keepHorizontalPos=True)
+        lines = self._breakPointLines
+        i = bisect.bisect_left(lines, currentLinenr)
+        if i > 0:
+            self.gotoLine(lines[i - 1], keepHorizontalPos=True)
 
     def jumpNextBreakpoint(self):
         currentLinenr = self.textCursor().blockNumber() + 1
-        newLinenr = min(
-            (linenr for linenr in self._breakPoints if linenr > currentLinenr),
-            default=None,
-        )
-        if newLinenr is not None:
-            self.gotoLine(newLinenr, keepHorizontalPos=True)
+        lines = self._breakPointLines
+        i = bisect.bisect_right(lines, currentLinenr)
+        if i < len(lines):
+            self.gotoLine(lines[i], keepHorizontalPos=True)
 
     def setDebugLineIndicator(self, linenr, active=True):
         """Set the debug line indicator to the given line number.
@@ -1356,7 +1711,9 @@ class BreakPoints:
 
     def _updateBreakPointWidth(self):
         """set width of breakpoint bar (actual points are smaller)"""
-        self._breakPointWidth = round(0.8 * self.cursorRect(self.textCursor()).height())
+        # The line height is also used to center the bullets
+        self._breakPointLineHeight = self.cursorRect(self.textCursor()).height()
+        self._breakPointWidth = round(0.8 * self._breakPointLineHeight)
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
@@ -1373,9 +1730,13 @@ class BreakPoints:
 
     def paintEvent(self, event):
         super().paintEvent(event)
-        # On repaint, update the complete breakPointArea
+        if not self.__showBreakPoints:
+            return  # the area is hidden
+        # On repaint, update the breakPointArea next to the repainted part
         w = self._getBreakPointAreaWidth()
-        self.__breakPointArea.update(0, 0, w, self.height())
+        self.__breakPointAreaScrollKey = _updateSideBar(
+            self, self.__breakPointArea, w, event, self.__breakPointAreaScrollKey
+        )
 
 
 class Wrap:
@@ -21,6 +21,7 @@ class BlockData(QtGui.QTextBlockUserData):
         self.indentation = None
         self.fullUnderlineFormat = None
         self.tokens = []
+        self.parenTokens = None  # lazily derived from tokens, for brace matching
 
 
 # The highlighter should be part of the base class, because
@@ -89,6 +90,7 @@ class Highlighter(QtGui.QSyntaxHighlighter):
 
         # Store token list for future use (e.g. brace matching)
         bd.tokens = tokens
+        bd.parenTokens = None
 
         # Handle underlines
         bd.fullUnderlineFormat = fullLineFormat
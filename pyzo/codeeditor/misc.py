@@ -5,7 +5,8 @@ Define the option property decorator.
 """
 
 from .qt import QtGui, QtCore, QtWidgets  # noqa
-from queue import Queue, Empty
+import threading
+from collections import deque
 
 
 DEFAULT_OPTION_NAME = "_ce_default_value"
@@ -52,22 +53,25 @@ class _CallbackEventHandler(QtCore.QObject):
 
     def __init__(self):
         super().__init__()
-        self.queue = Queue()
+        self._lock = threading.Lock()
+        self._queue = deque()
 
     def customEvent(self, event):
-        while True:
-            try:
-                callback, args = self.queue.get_nowait()
-            except Empty:
-                break
+        # Take all pending callbacks at once, and call them outside the lock
+        with self._lock:
+            queue, self._queue = self._queue, deque()
+        for callback, args in queue:
             try:
                 callback(*args)
             except Exception as why:
                 print("callback failed: {}:\n{}".format(callback, why))
 
     def postEventWithCallback(self, callback, *args):
-        self.queue.put((callback, args))
-        QtWidgets.qApp.postEvent(self, QtCore.QEvent(QtCore.QEvent.Type.User))
+        # Only post an event if there is none pending, it handles all callbacks
+        with self._lock:
+            if not self._queue:
+                QtWidgets.qApp.postEvent(self, QtCore.QEvent(QtCore.QEvent.Type.User))
+            self._queue.append((callback, args))
 
 
 def callLater(callback, *args):
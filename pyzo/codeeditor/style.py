@@ -76,6 +76,7 @@ class StyleFormat:
       * italic: (bool) whether the text should be in italic
       * underline: (int) whether an underline should be used (and which one)
       * linestyle: (int) what line style to use (e.g. for indent guides)
+      * pen: (QPen) a pen with the fore color and linestyle
       * textCharFormat: (QTextCharFormat) for the syntax styles
 
     The format neglects spaces and case. Parts are separated by commas
@@ -102,6 +103,7 @@ class StyleFormat:
         self._italic = None
         self._underline = None
         self._linestyle = None
+        self._pen = None
         self._textCharFormat = None
 
     def __str__(self):
@@ -216,6 +218,13 @@ class StyleFormat:
                 self._linestyle = Qt.PenStyle.SolidLine  # default to solid
         return self._linestyle
 
+    @property
+    def pen(self):
+        if self._pen is None:
+            self._pen = QtGui.QPen(self.fore)
+            self._pen.setStyle(self.linestyle)
+        return self._pen
+
     @property
     def textCharFormat(self):
         if self._textCharFormat is None:
@@ -6,14 +6,20 @@ See docs of the tab widget.
 
 import pyzo
 from pyzo.qt import QtCore, QtGui, QtWidgets  # noqa
+import os
 import sys
+import bisect
+import collections
 
 ELLIPSIS = chr(8230)
 
-# Constants for the alignments of tabs
+# Constants for the alignments of tabs (in average character widths)
 MIN_NAME_WIDTH = 4
 MAX_NAME_WIDTH = 64
 
+# The number of alignment results to remember
+FIT_CACHE_SIZE = 32
+
 
 ## Define style sheet for the tabs
 
@@ -91,6 +97,17 @@ STYLESHEET_REPLACEMENTS = [  # name, dark, light
 ]
 
 
+def _applyStyleSheetReplacements(stylesheet, dark):
+    for name, darkValue, lightValue in STYLESHEET_REPLACEMENTS:
+        stylesheet = stylesheet.replace(name, darkValue if dark else lightValue)
+    return stylesheet
+
+
+# The style sheets with the colors filled in, only the padding is left
+STYLESHEET_DARK = _applyStyleSheetReplacements(STYLESHEET, True)
+STYLESHEET_LIGHT = _applyStyleSheetReplacements(STYLESHEET, False)
+
+
 ## Define tab widget class
 
 
@@ -99,8 +116,14 @@ class TabData:
     tabData.
     """
 
+    __slots__ = ["basename", "data", "displayed", "minWidth", "name", "padWidth"]
+
     def __init__(self, name):
         self.name = name
+        self.basename = os.path.basename(name) or name
+        self.displayed = name  # The (elided) text shown in the tab bar
+        self.padWidth = None  # Width of the tab minus the width of its text
+        self.minWidth = 0  # Width of the tab when its text is short
         self.data = None
 
 
@@ -150,15 +173,12 @@ class CompactTabBar(QtWidgets.QTabBar):
             raise ValueError("Invalid value for padding.")
 
         # Set style sheet
-        stylesheet = STYLESHEET
+        stylesheet = STYLESHEET_DARK if pyzo.darkQt else STYLESHEET_LIGHT
         stylesheet = stylesheet.replace("PADDING_TOP", str(padding[0]))
         stylesheet = stylesheet.replace("PADDING_BOTTOM", str(padding[1]))
         stylesheet = stylesheet.replace("PADDING_LEFT", str(padding[2]))
         stylesheet = stylesheet.replace("PADDING_RIGHT", str(padding[3]))
 
-        for name, dark, light in STYLESHEET_REPLACEMENTS:
-            stylesheet = stylesheet.replace(name, dark if pyzo.darkQt else light)
-
         self.setStyleSheet(stylesheet)
 
         # We do our own eliding
@@ -174,14 +194,20 @@ class CompactTabBar(QtWidgets.QTabBar):
         self.setSelectionBehaviorOnRemove(self.SelectionBehavior.SelectPreviousTab)
 
         # Init alignment parameters
-        self._alignWidth = MIN_NAME_WIDTH  # Width in characters
-        self._alignWidthIsReducing = False  # Whether in process of reducing
-
-        # Create timer for aligning
-        self._alignTimer = QtCore.QTimer(self)
-        self._alignTimer.setInterval(10)
-        self._alignTimer.setSingleShot(True)
-        self._alignTimer.timeout.connect(self._alignRecursive)
+        self._alignChars = MIN_NAME_WIDTH  # Width in average characters
+        self._alignWidth = self._charsToWidth(MIN_NAME_WIDTH)
+        self._namesVersion = 0  # Incremented when the names change
+        self._lastAlignKey = None  # To skip alignment if nothing changed
+        self._fitCache = collections.OrderedDict()  # align key -> width
+        self._distinctVersion = None  # The names version of _distinctLengths
+        self._sortedNames = []  # The same names, sorted
+        self._distinctLengths = {}  # name -> n chars needed to distinguish
+
+        # Create timer to align once for a burst of changes (e.g. resizing)
+        self._alignPending = QtCore.QTimer(self)
+        self._alignPending.setInterval(16)
+        self._alignPending.setSingleShot(True)
+        self._alignPending.timeout.connect(self._doAlignTabs)
 
     def _compactTabBarData(self, i):
         """Get the underlying tab data for tab i. Only for internal use."""
@@ -198,10 +224,14 @@ class CompactTabBar(QtWidgets.QTabBar):
         # Done
         return tabData
 
+    def _getAllTabData(self):
+        """Get the underlying tab data for all tabs. Only for internal use."""
+        return [self._compactTabBarData(i) for i in range(self.count())]
+
     ## Overload a few methods
 
     def mouseDoubleClickEvent(self, event):
-        i = self.tabAt(event.position().toPoint())
+        i = self.tabAt(event.position().toPoint()) if self.count() else -1
         if i == -1:
             # There was no tab under the cursor
             self.barDoubleClicked.emit()
@@ -210,7 +240,7 @@ class CompactTabBar(QtWidgets.QTabBar):
             self.tabDoubleClicked.emit(i)
 
     def mousePressEvent(self, event):
-        if event.button() == QtCore.Qt.MouseButton.MiddleButton:
+        if event.button() == QtCore.Qt.MouseButton.MiddleButton and self.count():
             i = self.tabAt(event.position().toPoint())
             if i >= 0:
                 self.parent().tabCloseRequested.emit(i)
@@ -237,8 +267,23 @@ class CompactTabBar(QtWidgets.QTabBar):
     def setTabText(self, i, text):
         """set the text for tab i."""
         tabData = self._compactTabBarData(i)
-        if text != tabData.name:
-            tabData.name = text
+        if text == tabData.name:
+            return
+
+        # If no name is elided, and this one does not get wider, the tabs
+        # still fit and no other name is affected, so no need to align
+        fm = self.fontMetrics()
+        isCheap = all(t.displayed == t.name for t in self._getAllTabData()) and (
+            fm.horizontalAdvance(text) <= fm.horizontalAdvance(tabData.name)
+        )
+
+        tabData.name = text
+        tabData.basename = os.path.basename(text) or text
+        self._namesVersion += 1
+        if isCheap:
+            tabData.displayed = text
+            super().setTabText(i, text)
+        else:
             self.alignTabs()
 
     def tabText(self, i):
@@ -259,12 +304,14 @@ class CompactTabBar(QtWidgets.QTabBar):
         super().setTabData(i, tabData)
 
         # Update
+        self._namesVersion += 1
         self.alignTabs()
 
     def tabRemoved(self, i):
         super().tabRemoved(i)
 
         # Update
+        self._namesVersion += 1
         self.alignTabs()
 
     def resizeEvent(self, event):
@@ -275,6 +322,15 @@ class CompactTabBar(QtWidgets.QTabBar):
         super().showEvent(event)
         self.alignTabs()
 
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QtCore.QEvent.Type.FontChange:
+            # The tab widths learned for the old font no longer apply
+            for tabData in self._getAllTabData():
+                tabData.padWidth = None
+                tabData.minWidth = 0
+            self.alignTabs()
+
     ## For aligning
 
     def alignTabs(self):
@@ -283,31 +339,111 @@ class CompactTabBar(QtWidgets.QTabBar):
         Their names are ellided if required so that
         all tabs fit on the tab bar if possible. When there is too little
         space, the QTabBar will kick in and draw scroll arrows.
+
+        Calls that follow each other quickly result in a single alignment,
+        and nothing is done if the width, the names, the position of the
+        corner widget and the font have not changed.
         """
+        self._alignPending.start()
 
-        # Set name widths correct (in case new names were added)
-        self._setMaxWidthOfAllItems()
+    def _doAlignTabs(self):
+        """Align the tab items now."""
+
+        # Only if visible, and if something changed
+        if not self.isVisible() or not self.count():
+            return
+        cornerWidget = self.parent().cornerWidget()
+        key = (
+            self.width(),
+            self._namesVersion,
+            cornerWidget.x() if cornerWidget else None,
+            self.fontMetrics().averageCharWidth(),
+        )
+        if key == self._lastAlignKey:
+            return
+        self._lastAlignKey = key
+
+        # Did we align for this width, these names and this font before?
+        nchars = self._fitCache.get(key)
+        if nchars is not None:
+            self._fitCache.move_to_end(key)
+            if nchars != self._alignChars:
+                self._setAlignWidth(nchars)
+            return
+
+        # Find the widest names that fit, and apply
+        self._setAlignWidth(self._findAlignWidth())
 
-        # Start alignment process
-        self._alignWidthIsReducing = False
-        self._alignTimer.start()
+        # Correct in the rare case that the tabs are still too wide
+        while self._alignChars > MIN_NAME_WIDTH and self._getAlignMargin() < 0:
+            self._setAlignWidth(self._alignChars - 1)
 
-    def _alignRecursive(self):
-        """Recursive alignment of the items.
+        # Remember the result
+        self._fitCache[key] = self._alignChars
+        while len(self._fitCache) > FIT_CACHE_SIZE:
+            self._fitCache.popitem(last=False)
 
-        The alignment process should be initiated from alignTabs().
+    def _findAlignWidth(self):
+        """Find the widest width of the names (in average characters) for
+        which the tabs fit, based on the current tabs.
         """
 
-        # Only if visible
-        if not self.isVisible():
-            return
+        fm = self.fontMetrics()
+        tabDatas = self._getAllTabData()
+
+        # The width of a tab is its text width plus a padding (which includes
+        # buttons and icons), unless the text is so short that the tab has
+        # its minimum width. Learn these for each tab from its current size.
+        currentWidth = 0
+        for i, tabData in enumerate(tabDatas):
+            tabWidth = self.tabRect(i).width()
+            padWidth = tabWidth - fm.horizontalAdvance(tabData.displayed)
+            if tabData.padWidth is None or padWidth < tabData.padWidth:
+                tabData.padWidth = padWidth
+            elif padWidth > tabData.padWidth + 2:  # allow for rounding
+                tabData.minWidth = tabWidth
+            currentWidth += tabWidth
+        maxWidth = currentWidth + self._getAlignMargin()
+
+        def fits(nchars):
+            names = self._getElidedNames(tabDatas, self._charsToWidth(nchars))
+            width = 0
+            for tabData, name in zip(tabDatas, names):  # noqa: B905
+                textWidth = fm.horizontalAdvance(name)
+                width += max(tabData.minWidth, textWidth + tabData.padWidth)
+            return width <= maxWidth
+
+        # Bisect
+        if fits(MAX_NAME_WIDTH):
+            return MAX_NAME_WIDTH
+        lo, hi = MIN_NAME_WIDTH, MAX_NAME_WIDTH - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if fits(mid):
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def _setAlignWidth(self, nchars):
+        """Set the width of the names (in average characters) and apply."""
+        self._alignChars = nchars
+        self._alignWidth = self._charsToWidth(nchars)
+        self._setMaxWidthOfAllItems()
 
-        # Get tab bar and number of items
-        N = self.count()
+    def _charsToWidth(self, nchars):
+        """Get the width in pixels for names of the given width in average
+        characters. Room for the ellipsis of elided names comes on top.
+        """
+        fm = self.fontMetrics()
+        return nchars * fm.averageCharWidth() + fm.horizontalAdvance(ELLIPSIS)
+
+    def _getAlignMargin(self):
+        """Get the space between the last tab and the corner widget."""
 
         # Get right edge of last tab and left edge of corner widget
         pos1 = self.tabRect(0).topLeft()
-        pos2 = self.tabRect(N - 1).topRight()
+        pos2 = self.tabRect(self.count() - 1).topRight()
         cornerWidget = self.parent().cornerWidget()
         if cornerWidget:
             pos3 = cornerWidget.pos()
@@ -316,90 +452,103 @@ class CompactTabBar(QtWidgets.QTabBar):
         x1 = pos1.x()
         x2 = pos2.x()
         x3 = pos3.x()
-        alignMargin = x3 - (x2 - x1) - 3  # Must be positive (has margin)
-
-        # Are the tabs too wide?
-        if alignMargin < 0:
-            # Tabs extend beyond corner widget
-
-            # Reduce width then
-            self._alignWidth -= 1
-            self._alignWidth = max(self._alignWidth, MIN_NAME_WIDTH)
-
-            # Apply
-            self._setMaxWidthOfAllItems()
-            self._alignWidthIsReducing = True
+        return x3 - (x2 - x1) - 3  # Must be positive (has margin)
 
-            # Try again if there's still room for reduction
-            if self._alignWidth > MIN_NAME_WIDTH:
-                self._alignTimer.start()
-
-        elif alignMargin > 10 and not self._alignWidthIsReducing:
-            # Gap between tabs and corner widget is a bit large
-
-            # Increase width then
-            self._alignWidth += 1
-            self._alignWidth = min(self._alignWidth, MAX_NAME_WIDTH)
-
-            # Apply
-            itemsElided = self._setMaxWidthOfAllItems()
-
-            # Try again if there's still room for increment
-            if itemsElided and self._alignWidth < MAX_NAME_WIDTH:
-                self._alignTimer.start()
-                # self._alignTimer.timeout.emit()
-
-        else:
-            pass  # margin is good
-
-    def _getAllNames(self):
-        """get a list of all (full) tab names"""
-        return [self._compactTabBarData(i).name for i in range(self.count())]
+    def _getDistinctLength(self, name, allNames):
+        """get the amount of characters needed to distinguish the given name
+        from the given names. The result is cached for as long as the names
+        do not change.
+        """
+        if self._distinctVersion != self._namesVersion:
+            self._distinctVersion = self._namesVersion
+            self._sortedNames = sorted(allNames)
+            self._distinctLengths = {}
+        n = self._distinctLengths.get(name)
+        if n is None:
+            # The names that start with a prefix are adjacent in the sorted
+            # list, so the prefix is shared if the name after the first
+            # match starts with it too. Bisect for the shortest unique prefix.
+            sortedNames = self._sortedNames
+            lo, hi = 1, len(name)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                shortName = name[:mid]
+                j = bisect.bisect_left(sortedNames, shortName) + 1
+                if j < len(sortedNames) and sortedNames[j].startswith(shortName):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            n = lo
+            self._distinctLengths[name] = n
+        return n
 
     def _setMaxWidthOfAllItems(self):
-        """sets the maximum width of all items now, by eliding the names
+        """sets the maximum width of all items now, by eliding the names"""
+        tabDatas = self._getAllTabData()
+        names = self._getElidedNames(tabDatas, self._alignWidth)
+        changes = [
+            (i, name)
+            for i, (tabData, name) in enumerate(zip(tabDatas, names))  # noqa: B905
+            if name != tabData.displayed
+        ]
+        if not changes:
+            return
 
-        Returns whether any items were elided.
+        # Set texts now, with a single repaint afterwards
+        self.setUpdatesEnabled(False)
+        try:
+            for i, name in changes:
+                tabDatas[i].displayed = name
+                super().setTabText(i, name)
+        finally:
+            self.setUpdatesEnabled(True)
+
+    def _getElidedNames(self, tabDatas, width):
+        """get the names to show for the given tabs, elided to the given
+        width in pixels.
         """
 
-        # Get whether an item was reduced in size
-        itemReduced = False
-
-        for i in range(self.count()):
-            # Get width
-            w = self._alignWidth
-
-            # Get name
-            name = self._compactTabBarData(i).name
-
-            # If it's too long, first make it shorter by stripping dir names
-            if w + 1 < len(name) and "/" in name:
-                name = name.split("/")[-1]
-
-            # Check if we can reduce the name size, correct w if necessary
-            if ((w + 1) < len(name)) and self._preventEqualTexts:
-                # Increase w until there are no names that start the same
-                allNames = self._getAllNames()
-                hasSimilarNames = True
-                diff = 2
-                w -= 1
-                while hasSimilarNames and w < len(name):
-                    w += 1
-                    w2 = w - (diff - 1)
-                    shortName = name[:w2]
-                    similarnames = [n for n in allNames if n[:w2] == shortName]
-                    hasSimilarNames = len(similarnames) > 1
-
-            # Check again, with corrected w
-            if w + 1 < len(name):
-                name = name[:w] + ELLIPSIS
-                itemReduced = True
-
-            # Set text now
-            super().setTabText(i, name)
+        # Names are elided by Qt, using the real width of the glyphs
+        fm = self.fontMetrics()
+        elideRight = QtCore.Qt.TextElideMode.ElideRight
+        ellipsisWidth = fm.horizontalAdvance(ELLIPSIS)
+
+        allNames = [tabData.name for tabData in tabDatas]
+        elidedNames = []
+
+        for tabData in tabDatas:
+            w = width
+
+            # Get name, if it's too long, first make it shorter by stripping
+            # dir names
+            name = tabData.name
+            nameWidth = fm.horizontalAdvance(name)
+            if nameWidth > w and tabData.basename != name:
+                name = tabData.basename
+                nameWidth = fm.horizontalAdvance(name)
+
+            # Names that fit are not elided
+            if nameWidth > w:
+                # Check if we can reduce the name size, correct w if necessary.
+                # Show at least MIN_NAME_WIDTH characters, and one more character
+                # than needed to distinguish the name.
+                nchars = MIN_NAME_WIDTH
+                if self._preventEqualTexts:
+                    n = self._getDistinctLength(name, allNames)
+                    nchars = max(nchars, n + 1)
+                w = max(w, fm.horizontalAdvance(name[:nchars]) + ellipsisWidth)
+
+                # Elide with the corrected w. Qt may keep one character less
+                # than fits (because of rounding), so enforce the minimum.
+                elidedName = fm.elidedText(name, elideRight, w)
+                if elidedName != name and len(elidedName) <= nchars:
+                    elidedName = name[:nchars] + ELLIPSIS
+                name = elidedName
+
+            elidedNames.append(name)
 
         # Done
-        return itemReduced
+        return elidedNames
 
 
 class CompactTabWidget(QtWidgets.QTabWidget):
@@ -410,8 +559,8 @@ class CompactTabWidget(QtWidgets.QTabWidget):
     items fit on the same space.
 
     Further much care is taken to ellide the names in a smart way:
-      * All items are allowed the same amount of characters instead of
-        that the same amount of characters is removed from all names.
+      * All items are allowed the same width instead of that the same
+        amount of characters is removed from all names.
       * If there are two items with the same beginning, it is made
         sure that enough characters are shown such that the names
         can be distinguished.
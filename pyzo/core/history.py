@@ -22,10 +22,13 @@ class CommandHistory(QtCore.QObject):
         self._commands = []
         self._fname = fname
         self._last_date = datetime.date(2000, 1, 1)
-        self._load()
+        self._loaded = False  # The file is loaded when the history is first used
 
     def _load(self):
-        """Load commands from file."""
+        """Load commands from file, if not done yet."""
+        if self._loaded:
+            return
+        self._loaded = True
         if not self._fname:
             return
 
@@ -61,8 +64,8 @@ class CommandHistory(QtCore.QObject):
 
     def save(self):
         """Save the commands to disk."""
-        if not self._fname:
-            return
+        if not self._fname or not self._loaded:
+            return  # if not loaded, there is nothing new to save
         filename = os.path.join(pyzo.appDataDir, self._fname)
         try:
             with open(filename, "wt", encoding="utf-8") as f:
@@ -72,10 +75,12 @@ class CommandHistory(QtCore.QObject):
 
     def get_commands(self):
         """Get a list of all commands (latest last)."""
+        self._load()
         return self._commands.copy()
 
     def append(self, command):
         """Add a command to the list."""
+        self._load()
         command = command.rstrip()
         if not command:
             return
@@ -107,11 +112,13 @@ class CommandHistory(QtCore.QObject):
 
     def pop(self, index):
         """Remove a command by index."""
+        self._load()
         self._commands.pop(index)
         self.command_removed.emit(index)
 
     def find_starting_with(self, firstpart, n=1):
         """Find the nth (1-based) command that starts with firstpart, or None."""
+        self._load()
         count = 0
         for c in reversed(self._commands):
             if c.startswith(firstpart):
@@ -122,4 +129,5 @@ class CommandHistory(QtCore.QObject):
 
     def find_all(self, needle):
         """Find all commands that contain the given text. In order of being used."""
+        self._load()
         return [cmd for cmd in reversed(self._commands) if needle in cmd]
@@ -7,28 +7,57 @@ function which is also defined here.
 """
 
 import os
+import re
 import sys
 import time
 import base64
-from queue import Queue, Empty
+import threading
+from collections import deque
 
 import pyzo
 from pyzo.core.icons import IconArtist
 from pyzo.core import commandline
-from pyzo.core.statusbar import StatusBar
 from pyzo.qt import QtCore, QtGui, QtWidgets
-from pyzo.core.splash import SplashWidget
 from pyzo.util import paths
 from pyzo.util import zon as ssdf  # zon is ssdf-light
 from pyzo import translate
 from pyzo.core.views import ViewManager
 
 
+# To get the colors from a style string, e.g.: "fore:#657b83, back:#fff"
+_STYLE_COLOR_RE = re.compile(r"(fore|back)\s*:\s*([^,\s]+)")
+
+
+class _TitleFields:
+    """Mapping of the fields that can be used in the window title,
+    for the given file path. Each field is computed when it is used.
+    """
+
+    def __init__(self, path):
+        self._path = path
+
+    def __getitem__(self, key):
+        path = self._path
+        name = os.path.basename(path)
+        if key in ("fileName", "filename", "name"):
+            return name
+        elif key in ("fullPath", "fullpath", "path"):
+            if name == path and not os.path.isfile(path):
+                return translate("main", "unsaved")
+            return path  # We hope the given path is informative
+        else:
+            raise KeyError(key)
+
+
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self, parent=None, locale=None):
         super().__init__(parent)
 
+        # Used to hold the splash screen until startup took at least 1 s
+        startTime = time.time()
+
         self._closeflag = 0  # Used during closing/restarting
+        self._paintLoop = None  # Used by paintNow()
 
         # Init window title and application icon
         # Set title to something nice. On Ubuntu 12.10 this text is what
@@ -44,6 +73,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.restoreGeometry()
 
         # Show splash screen (we need to set our color too)
+        from pyzo.core.splash import SplashWidget
+
         w = SplashWidget(self, distro="no distro")
         self.setCentralWidget(w)
         self.setStyleSheet("QMainWindow { background-color: #268bd2;}")
@@ -53,8 +84,13 @@ class MainWindow(QtWidgets.QMainWindow):
         self.paintNow()
         self.setUpdatesEnabled(False)
 
-        # Determine timeout for showing splash screen
-        splash_timeout = time.time() + 1.0
+        # Instantiate and start source-code parser, so that it is ready
+        # by the time that the editors are created
+        if pyzo.parser is None:
+            from pyzo.core import codeparser
+
+            pyzo.parser = codeparser.Parser()
+            pyzo.parser.start()
 
         # Set locale of main widget, so that qt strings are translated
         # in the right way
@@ -93,9 +129,7 @@ class MainWindow(QtWidgets.QMainWindow):
         try:
             theme = pyzo.themes[pyzo.config.settings.theme.lower()]["data"]
             s = theme["editor.text"]  # e.g.: "fore:#657b83, back:#fff"
-            colors = dict(
-                [tuple(s3.strip() for s3 in s2.split(":")) for s2 in s.split(",")]
-            )
+            colors = dict(_STYLE_COLOR_RE.findall(s))
             pyzo.darkSyntax = (
                 QtGui.QColor(colors["fore"]).lightness()
                 > QtGui.QColor(colors["back"]).lightness()
@@ -103,22 +137,26 @@ class MainWindow(QtWidgets.QMainWindow):
         except KeyError:
             pyzo.darkSyntax = False
 
-        # Hold the splash screen if needed
-        while time.time() < splash_timeout:
-            QtWidgets.qApp.sendPostedEvents()
-            QtWidgets.qApp.processEvents()
-            time.sleep(0.05)
+        # Hold the splash screen if startup took less than 1 s so far
+        timeout = 1.0 - (time.time() - startTime)
+        if timeout > 0:
+            loop = QtCore.QEventLoop()
+            QtCore.QTimer.singleShot(int(timeout * 1000), loop.quit)
+            loop.exec()
 
         # Populate the window (imports more code)
         self._populate()
 
-        # Revert to normal background, and enable updates
+        # Revert to normal background
         self.setStyleSheet("")
-        self.setUpdatesEnabled(True)
 
-        # Restore window state, force updating, and restore again
+        # Restore window state, then enable updates and process the
+        # resulting layout events
         self.restoreState()
-        self.paintNow()
+        self.setUpdatesEnabled(True)
+        QtWidgets.qApp.processEvents(
+            QtCore.QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents
+        )
         self.restoreState()
         pyzo.editors.restoreEditorState()
 
@@ -149,35 +187,27 @@ class MainWindow(QtWidgets.QMainWindow):
     # To force drawing ourselves
     def paintEvent(self, event):
         super().paintEvent(event)
-        self._ispainted = True
+        if self._paintLoop is not None:
+            self._paintLoop.quit()
+            self._paintLoop = None
 
     def paintNow(self):
-        """Enforce a repaint and keep calling processEvents until
-        we are repainted.
-        """
-        self._ispainted = False
+        """Enforce a repaint and run an event loop until we are repainted."""
+        self._paintLoop = loop = QtCore.QEventLoop()
         self.update()
-        while not self._ispainted:
-            QtWidgets.qApp.sendPostedEvents()
-            QtWidgets.qApp.processEvents()
-            time.sleep(0.01)
+        loop.exec()
 
     def _populate(self):
         # Delayed imports
         from pyzo.core.editorTabs import EditorTabs
         from pyzo.core.shellStack import ShellStackWidget
-        from pyzo.core import codeparser
         from pyzo.core.history import CommandHistory
+        from pyzo.core.statusbar import StatusBar
         from pyzo.tools import ToolManager
 
         # Instantiate tool manager
         pyzo.toolManager = ToolManager()
 
-        # Instantiate and start source-code parser
-        if pyzo.parser is None:
-            pyzo.parser = codeparser.Parser()
-            pyzo.parser.start()
-
         # Create editor stack and make the central widget
         pyzo.editors = EditorTabs(self)
         self.setCentralWidget(pyzo.editors)
@@ -231,24 +261,8 @@ class MainWindow(QtWidgets.QMainWindow):
             # Plain title
             title = "Interactive Editor for Python"
         else:
-            # Title with a filename
-            name = os.path.basename(path)
-            if os.path.isfile(path):
-                pass
-            elif name == path:
-                path = translate("main", "unsaved")
-            else:
-                pass  # We hope the given path is informative
-            # Set title
-            tmp = {
-                "fileName": name,
-                "filename": name,
-                "name": name,
-                "fullPath": path,
-                "fullpath": path,
-                "path": path,
-            }
-            title = pyzo.config.advanced.titleText.format(**tmp)
+            # Title with a filename, fields are only computed when used
+            title = pyzo.config.advanced.titleText.format_map(_TitleFields(path))
 
         # Set
         self.setWindowTitle(title)
@@ -298,7 +312,7 @@ class MainWindow(QtWidgets.QMainWindow):
             try:
                 geometry = pyzo.config.state.windowGeometry
                 geometry = base64.decodebytes(geometry.encode("ascii"))
-                self.restoreGeometry(geometry)
+                super().restoreGeometry(geometry)
             except Exception as err:
                 print("Could not restore window geometry: " + str(err))
 
@@ -313,7 +327,7 @@ class MainWindow(QtWidgets.QMainWindow):
             try:
                 state = pyzo.config.state.windowState
                 state = base64.decodebytes(state.encode("ascii"))
-                self.restoreState(state)
+                super().restoreState(state)
             except Exception as err:
                 print("Could not restore window state: " + str(err))
 
@@ -330,6 +344,11 @@ class MainWindow(QtWidgets.QMainWindow):
             # Get native palette (used below)
             QtWidgets.qApp.nativePalette = QtWidgets.qApp.palette()
 
+            # Get names of available styles (these do not change)
+            self._qtStyleNames = {
+                name.lower() for name in QtWidgets.QStyleFactory.keys()
+            }
+
             # Obtain default style name
             pyzo.defaultQtStyleName = str(QtWidgets.qApp.style().objectName())
 
@@ -350,8 +369,7 @@ class MainWindow(QtWidgets.QMainWindow):
             stylename = pyzo.config.view.qtstyle
 
         # Check if this style exist, set to default otherwise
-        styleNames = [name.lower() for name in QtWidgets.QStyleFactory.keys()]
-        if stylename.lower() not in styleNames:
+        if stylename.lower() not in self._qtStyleNames:
             stylename = pyzo.defaultQtStyleName
 
         # Try changing the style
@@ -406,12 +424,11 @@ class MainWindow(QtWidgets.QMainWindow):
                 tool.cleanUp()
 
         # Stop all threads (this should really only be daemon threads)
-        import threading
-
         for thread in threading.enumerate():
-            if hasattr(thread, "stop"):
+            stop = getattr(thread, "stop", None)
+            if stop is not None:
                 try:
-                    thread.stop(0.1)
+                    stop(0.1)
                 except Exception:
                     pass
 
@@ -470,17 +487,13 @@ class MainWindow(QtWidgets.QMainWindow):
         menu = super().createPopupMenu()
         menu.clear()
 
-        # The build_callback function is necessary because without that, a simple lambda
-        # would bind the argument to the latest action of the for loop via the closure.
-        def build_callback(cb, action):
-            return lambda: cb(action.isChecked())
-
-        # Add all tools, with checkmarks for those that are active
+        # Add all tools, with checkmarks for those that are active. The triggered
+        # signal of a checkable action passes the new checked state to the launcher.
         for tool in pyzo.toolManager.getToolInfo():
             a = menu.addAction(tool.name)
             a.setCheckable(True)
             a.setChecked(bool(tool.instance))
-            a.triggered.connect(build_callback(tool.menuLauncher, a))
+            a.triggered.connect(tool.menuLauncher)
 
         return menu
 
@@ -496,8 +509,10 @@ def loadAppIcons():
     # Get directory containing the icons
     appiconDir = os.path.join(pyzo.pyzoDir, "resources", "appicons")
 
-    # Determine template for filename of the application icon-files.
+    # Collect the application icon-files, in a single scan of the directory
     fnameT = "pyzologo{}.png"
+    with os.scandir(appiconDir) as it:
+        appiconFiles = {e.name: e.path for e in it if e.is_file()}
 
     # Construct application icon. Include a range of resolutions. Note that
     # Qt somehow does not use the highest possible res on Linux/Gnome(?), even
@@ -505,24 +520,28 @@ def loadAppIcons():
     pyzo.icon = QtGui.QIcon()
 
     # Construct another icon to show when the current shell is busy
-    pyzo.iconRunning = QtGui.QIcon(pyzo.icon)
+    pyzo.iconRunning = QtGui.QIcon()
+
+    # Draw the "running" overlay (a green triangle) once at the largest
+    # size; it is the same shape at every size, so we just scale it down
+    artist = IconArtist(size=256)
+    artist.setPenColor("#0D0")
+    artist.setBrushColor("#0D0")
+    artist.addPolygon([(160, 255), (255, 160), (160, 65)])
+    overlay = artist.finish().pixmap(256, 256)
 
     for sze in [16, 32, 48, 64, 128, 256]:
-        fname = os.path.join(appiconDir, fnameT.format(sze))
-        if os.path.isfile(fname):
-            pyzo.icon.addFile(fname, QtCore.QSize(sze, sze))
-
-            artist = IconArtist(pyzo.icon, size=sze)
-            artist.setPenColor("#0D0")
-            artist.setBrushColor("#0D0")
-            a = 6 * sze // 16
-            x2 = sze - 1
-            x1 = x2 - a + 1
-            y1 = sze - 1
-            y2 = y1 - a + 1
-            y3 = y2 - a + 1
-            artist.addPolygon([(x1, y1), (x2, y2), (x1, y3)])
-            pm = artist.finish().pixmap(sze, sze)
+        fname = appiconFiles.get(fnameT.format(sze))
+        if fname:
+            # Read each file once, and draw the overlay on a copy
+            pm = QtGui.QPixmap(fname)
+            pyzo.icon.addPixmap(pm)
+
+            pm = pm.copy()
+            painter = QtGui.QPainter(pm)
+            painter.setRenderHint(QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+            painter.drawPixmap(0, 0, sze, sze, overlay)
+            painter.end()
             pyzo.iconRunning.addPixmap(pm)
 
     # Set as application icon. This one is used as the default for all
@@ -530,29 +549,37 @@ def loadAppIcons():
     QtWidgets.qApp.setWindowIcon(pyzo.icon)
 
 
+class _LazyIconDict(ssdf.Dict):
+    """Dict of icons that maps names to filenames, and creates the
+    QIcon for a name when it is first used.
+    """
+
+    __slots__ = []
+
+    def __getitem__(self, name):
+        icon = ssdf.Dict.__getitem__(self, name)
+        if isinstance(icon, str):
+            # A file that cannot be read gives a null icon, no error
+            fname, icon = icon, QtGui.QIcon()
+            icon.addFile(fname, QtCore.QSize(16, 16))
+            self[name] = icon
+        return icon
+
+
 def loadIcons():
     """Load all icons in the icon dir."""
     # Get directory containing the icons
     iconDir = os.path.join(pyzo.pyzoDir, "resources", "icons")
 
-    # Construct other icons
-    dummyIcon = IconArtist().finish()
-    pyzo.icons = ssdf.new()
-    for fname in os.listdir(iconDir):
-        if fname.endswith(".png"):
-            try:
-                # Short and full name
-                name = fname.split(".")[0]
+    # Register the icon files, the icons are created on first use
+    pyzo.icons = _LazyIconDict()
+    with os.scandir(iconDir) as it:
+        for entry in it:
+            if entry.name.endswith(".png") and entry.is_file():
+                # Short name
+                name = entry.name.split(".")[0]
                 name = name.replace("pyzo_", "")  # discard prefix
-                ffname = os.path.join(iconDir, fname)
-                # Create icon
-                icon = QtGui.QIcon()
-                icon.addFile(ffname, QtCore.QSize(16, 16))
-                # Store
-                pyzo.icons[name] = icon
-            except Exception as err:
-                pyzo.icons[name] = dummyIcon
-                print("Could not load icon {}: {}".format(fname, err))
+                pyzo.icons[name] = entry.path
 
     artist = IconArtist("folder_page")
     artist.addLayer("arrow_refresh")
@@ -593,22 +620,25 @@ class _CallbackEventHandler(QtCore.QObject):
 
     def __init__(self):
         super().__init__()
-        self.queue = Queue()
+        self._lock = threading.Lock()
+        self._queue = deque()
 
     def customEvent(self, event):
-        while True:
-            try:
-                callback, args = self.queue.get_nowait()
-            except Empty:
-                break
+        # Take all pending callbacks at once, and call them outside the lock
+        with self._lock:
+            queue, self._queue = self._queue, deque()
+        for callback, args in queue:
             try:
                 callback(*args)
             except Exception as why:
                 print("callback failed: {}:\n{}".format(callback, why))
 
     def postEventWithCallback(self, callback, *args):
-        self.queue.put((callback, args))
-        QtWidgets.qApp.postEvent(self, QtCore.QEvent(QtCore.QEvent.Type.User))
+        # Only post an event if there is none pending, it handles all callbacks
+        with self._lock:
+            if not self._queue:
+                QtWidgets.qApp.postEvent(self, QtCore.QEvent(QtCore.QEvent.Type.User))
+            self._queue.append((callback, args))
 
 
 def callLater(callback, *args):
@@ -133,6 +133,7 @@ def old_print(self):
 
 
 if API in ("PySide2", "PyQt5"):
+    QtCore.QEventLoop.exec = old_exec
     QtWidgets.QMenu.exec = old_exec
     QtWidgets.QApplication.exec = old_exec
     QtWidgets.QPlainTextEdit.print = old_print